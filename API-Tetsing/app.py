@@ -1,12 +1,19 @@
 import asyncio
+import atexit
+import json
+import logging
 import os
 import streamlit as st
 from dotenv import load_dotenv
-from langchain_aws import ChatBedrock
+from langchain_aws import ChatBedrockConverse
 from mcp_use import MCPAgent, MCPClient
 import boto3
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import traceback
+import threading
+import time
 import shutil
 import tempfile
 from pathlib import Path
@@ -18,23 +25,99 @@ st.set_page_config(
     layout="wide"
 )
 
+# Agent configuration
+AWS_REGION = "us-east-1"  # Change to your preferred region
+MODEL_ID = "anthropic.claude-3-sonnet-20240229-v1:0"
+MODEL_KWARGS = {"max_tokens": 4096, "temperature": 0.7, "top_p": 0.9}
+MAX_STEPS = 30
+BEDROCK_MAX_CONNECTIONS = 50  # Bedrock connection pool and event loop executor size
+MAX_HISTORY = 100  # Chat messages kept in session state
+STREAM_FLUSH_CHUNKS = 16  # Streamed chunks buffered before the answer is redrawn
+STREAM_FLUSH_INTERVAL = 0.05  # Seconds between answer redraws while streaming
+MCP_CONFIG_FILE = "browser_mcp.json"
+PROFILE_DIR = Path.home() / ".config" / "browseruse" / "profiles" / "default"
+PROFILE_CLEANUP_WORKERS = 8  # Threads unlinking browser profile files
+PROFILE_UNLINK_BATCH = 128  # Files unlinked per worker task
+
+logger = logging.getLogger(__name__)
+
+# Example questions shown in the sidebar, with static widget keys
+EXAMPLE_QUESTIONS = (
+    ("example_time", "What's the current time?"),
+    ("example_python", "Search for information about Python"),
+    ("example_ai_news", "Find news about artificial intelligence"),
+    ("example_languages", "What are the top programming languages?"),
+    ("example_weather", "Search for weather information"),
+)
+
+def unlink_files(paths):
+    """Unlink a batch of files, skipping any that are already gone"""
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+def remove_tree(root):
+    """Delete a directory tree, unlinking its files in parallel batches (missing entries are skipped)"""
+    files, dirs, pending = [], [], [root]
+    while pending:
+        directory = pending.pop()
+        dirs.append(directory)
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    else:
+                        files.append(entry.path)
+        except FileNotFoundError:
+            continue
+    
+    batches = [files[i:i + PROFILE_UNLINK_BATCH] for i in range(0, len(files), PROFILE_UNLINK_BATCH)]
+    with ThreadPoolExecutor(max_workers=PROFILE_CLEANUP_WORKERS) as pool:
+        list(pool.map(unlink_files, batches))
+    
+    # Directories were collected parents first, so remove them in reverse
+    for directory in reversed(dirs):
+        try:
+            os.rmdir(directory)
+        except FileNotFoundError:
+            pass
+
+def remove_browser_profile():
+    """Remove the browser profile directory, returning whether it existed"""
+    if not PROFILE_DIR.exists():
+        return False
+    remove_tree(PROFILE_DIR)
+    return True
+
 def clean_browser_profile():
     """Clean up browser profile directory to fix launch issues"""
     try:
-        profile_dir = Path.home() / ".config" / "browseruse" / "profiles" / "default"
-        if profile_dir.exists():
-            shutil.rmtree(profile_dir)
+        cleaned = run_async(clean_idle_browser_profile(get_mcp_client(), get_mcp_lock()))
+        if cleaned is None:
+            st.warning("The shared browser is in use, so its profile was kept")
+            return False
+        if cleaned:
             st.info("Cleaned browser profile directory")
         return True
     except Exception as e:
         st.warning(f"Could not clean browser profile: {e}")
         return False
 
+@st.cache_resource
+def get_browser_dir():
+    """Create the temporary browser profile directory (reused across agent resets)"""
+    temp_dir = tempfile.mkdtemp(prefix="mcp_browser_")
+    atexit.register(shutil.rmtree, temp_dir, ignore_errors=True)
+    return temp_dir
+
 def create_browser_config():
     """Create a clean browser configuration"""
     try:
-        # Create a temporary directory for browser profile
-        temp_dir = tempfile.mkdtemp(prefix="mcp_browser_")
+        # Reuse the temporary directory for browser profile so its caches stay warm
+        temp_dir = get_browser_dir()
         
         # Set environment variables for browser configuration
         os.environ["BROWSERUSE_USER_DATA_DIR"] = temp_dir
@@ -46,95 +129,303 @@ def create_browser_config():
         return None
 
 @st.cache_resource
+def get_event_loop():
+    """Start a persistent event loop in a background thread (shared across reruns)"""
+    loop = asyncio.new_event_loop()
+    # Streaming Bedrock calls and to_thread work wait on the network inside executor
+    # threads, so size the executor for concurrent users rather than the CPU count
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=BEDROCK_MAX_CONNECTIONS))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+def submit_async(coro):
+    """Schedule a coroutine on the persistent event loop and return its future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+def run_async(coro):
+    """Run a coroutine on the persistent event loop and wait for its result"""
+    return submit_async(coro).result()
+
+def iter_async(agen):
+    """Iterate an async generator on the persistent event loop from the script thread"""
+    try:
+        while True:
+            try:
+                yield run_async(agen.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        run_async(agen.aclose())
+
+def chunk_text(chunk):
+    """Extract the text from a streamed model message chunk"""
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(
+        block.get("text", "")
+        for block in chunk.content
+        if isinstance(block, dict) and block.get("type") == "text"
+    )
+
+def warm_bedrock_connection(client):
+    """Open a pooled connection to Bedrock with a one-token request"""
+    try:
+        client.converse(
+            modelId=MODEL_ID,
+            messages=[{"role": "user", "content": [{"text": "ping"}]}],
+            inferenceConfig={"maxTokens": 1},
+        )
+    except Exception:
+        # Only the warm connection matters; real errors surface on the first request
+        pass
+
+@st.cache_resource
+def get_bedrock_client():
+    """Create the Bedrock runtime client (cached so its connection pool survives agent resets)"""
+    # Uses IAM role from EC2 instance
+    client = boto3.client(
+        service_name='bedrock-runtime',
+        region_name=AWS_REGION,
+        config=Config(
+            max_pool_connections=BEDROCK_MAX_CONNECTIONS,
+            tcp_keepalive=True,
+            retries={"max_attempts": 10, "mode": "adaptive"},
+        ),
+    )
+    
+    # Warm DNS, TLS and the connection pool in the background before the first message
+    submit_async(asyncio.to_thread(warm_bedrock_connection, client))
+    return client
+
+@st.cache_data(max_entries=1)
+def parse_mcp_config(path, mtime_ns):
+    """Parse the MCP configuration file (cached until its modification time changes)"""
+    with open(path, "rb") as f:
+        return json.load(f)
+
+def load_mcp_config(path):
+    """Load the MCP configuration, re-parsing the file only when it has changed"""
+    return parse_mcp_config(path, os.stat(path).st_mtime_ns)
+
+@st.cache_resource
+def get_mcp_client():
+    """Create the MCP client (shared by every user so its server sessions start only once)"""
+    return MCPClient.from_dict(load_mcp_config(MCP_CONFIG_FILE))
+
+@st.cache_resource
+def get_mcp_lock():
+    """Create the lock that serializes opening the shared MCP sessions"""
+    return asyncio.Lock()
+
+async def connect_mcp_client(client, lock):
+    """Open the shared MCP client's server sessions once, however many users ask"""
+    async with lock:
+        if not client.get_all_active_sessions():
+            # Nobody is driving the browser yet, so launch it on a clean profile; a
+            # failed cleanup must not stop the sessions from opening
+            try:
+                await asyncio.to_thread(remove_browser_profile)
+            except Exception:
+                logger.warning("Could not clean browser profile", exc_info=True)
+            await client.create_all_sessions()
+
+async def clean_idle_browser_profile(client, lock):
+    """Remove the browser profile unless the shared MCP sessions are using the browser"""
+    async with lock:
+        if client.get_all_active_sessions():
+            return None
+        return await asyncio.to_thread(remove_browser_profile)
+
+@st.cache_resource
+def get_llm():
+    """Create the Bedrock chat model (cached and shared across agent resets)"""
+    # Create LLM using ChatBedrockConverse (streams via the Bedrock ConverseStream API)
+    return ChatBedrockConverse(
+        client=get_bedrock_client(),
+        model_id=MODEL_ID,
+        **MODEL_KWARGS,
+    )
+
+def start_agent(agent):
+    """Load an agent's MCP tools, marking its system prompt for Bedrock prompt caching"""
+    run_async(agent.initialize())
+    
+    # Prompt caching is only for models that support it (e.g. Claude 3.5 Haiku,
+    # Claude 3.7 Sonnet). Bedrock caches everything before the cache point, so put it
+    # after the system prompt MCPAgent builds, covering the tool schemas and the prompt
+    if os.getenv("BEDROCK_PROMPT_CACHING", "false").lower() == "true":
+        agent.set_system_message([
+            {"type": "text", "text": agent.get_system_message().content},
+            ChatBedrockConverse.create_cache_point(),
+        ])
+
 def initialize_agent():
-    """Initialize the MCP agent (cached to avoid recreation)"""
+    """Initialize this session's MCP agent on top of the shared MCP client and LLM"""
     try:
         # Load environment variables
         load_dotenv()
         
-        # Clean browser profile and create new config
-        clean_browser_profile()
+        # Create browser config
         browser_dir = create_browser_config()
         
         if not browser_dir:
             st.error("Failed to create browser configuration")
             return None
         
-        # Create MCPClient from configuration file with browser settings
+        # Get the shared MCPClient created from the configuration file
         try:
-            client = MCPClient.from_config_file("browser_mcp.json")
+            client = get_mcp_client()
         except FileNotFoundError:
-            st.error("browser_mcp.json configuration file not found")
+            st.error(f"{MCP_CONFIG_FILE} configuration file not found")
             return None
         except Exception as e:
             st.error(f"Failed to load MCP configuration: {e}")
             return None
         
-        # Create Bedrock client (uses IAM role from EC2 instance)
+        # Get the shared Bedrock client
         try:
-            bedrock_client = boto3.client(
-                service_name='bedrock-runtime',
-                region_name='us-east-1'  # Change to your preferred region
-            )
+            get_bedrock_client()
         except Exception as e:
             st.error(f"Failed to create Bedrock client: {e}")
             return None
         
-        # Create LLM using ChatBedrock
-        llm = ChatBedrock(
-            client=bedrock_client,
-            model_id="anthropic.claude-3-sonnet-20240229-v1:0",
-            model_kwargs={
-                "max_tokens": 4096,
-                "temperature": 0.7,
-                "top_p": 0.9,
-            }
-        )
+        # Get the shared LLM
+        llm = get_llm()
         
-        # Create agent with the client
-        agent = MCPAgent(llm=llm, client=client, max_steps=30)
+        # Open the shared MCP sessions on a clean profile (first user only), then give
+        # this session its own agent, with its own conversation memory, on top of them
+        run_async(connect_mcp_client(client, get_mcp_lock()))
+        agent = MCPAgent(llm=llm, client=client, max_steps=MAX_STEPS)
+        start_agent(agent)
         
         st.success("MCP Agent initialized successfully")
         return agent
         
     except Exception as e:
         st.error(f"Failed to initialize agent: {str(e)}")
-        st.error(f"Full traceback: {traceback.format_exc()}")
+        st.exception(e)
         return None
 
 async def get_agent_response(agent, query):
-    """Get response from the MCP agent"""
+    """Stream tool calls and response text from the MCP agent as they happen"""
     try:
-        result = await agent.run(query)
-        return result
+        # ConverseStream chunks are pulled with next() in the loop's executor by
+        # langchain-core, so the blocking boto3 iterator never runs on the loop itself
+        async for event in agent.stream_events(query):
+            if event["event"] == "on_chat_model_start":
+                yield "step", None
+            elif event["event"] == "on_tool_start":
+                yield "tool", event["name"]
+            elif event["event"] == "on_chat_model_stream":
+                text = chunk_text(event["data"]["chunk"])
+                if text:
+                    yield "text", text
     except Exception as e:
-        error_msg = f"Error: {str(e)}\n\nFull traceback:\n{traceback.format_exc()}"
-        st.error(f"Agent execution failed: {str(e)}")
-        return error_msg
+        # Runs on the background loop thread, so leave UI reporting to the caller
+        yield "error", e
+
+def render_agent_stream(events, status):
+    """Write tool calls and errors into the status container and yield the response text"""
+    state = "complete"
+    step_parts = []
+    for kind, value in events:
+        if kind == "step":
+            # A new model call started, so the text so far was narration before a tool
+            # call: move it into the status and yield None so only the answer is kept
+            if step_parts:
+                status.markdown("".join(step_parts))
+                step_parts = []
+                yield None
+        elif kind == "tool":
+            status.write(f"Using tool `{value}`")
+        elif kind == "error":
+            # The traceback is only formatted here, inside the collapsed status
+            state = "error"
+            status.code("".join(traceback.format_exception(value)), language="text")
+            # Move any partial answer into the status so the error is shown on its own
+            if step_parts:
+                status.markdown("".join(step_parts))
+                step_parts = []
+                yield None
+            yield f"Error: {str(value)}"
+        else:
+            step_parts.append(value)
+            yield value
+    status.update(label="Done" if state == "complete" else "Failed", state=state, expanded=False)
+
+def write_batched(chunks):
+    """Render streamed text into a single placeholder, flushing in batches, and return it"""
+    placeholder = st.empty()
+    parts, pending, last_flush = [], 0, time.monotonic()
+    for chunk in chunks:
+        # None discards the text so far (narration that preceded a tool call)
+        if chunk is None:
+            parts, pending = [], 0
+            placeholder.empty()
+            continue
+        parts.append(chunk)
+        pending += 1
+        if pending >= STREAM_FLUSH_CHUNKS or time.monotonic() - last_flush >= STREAM_FLUSH_INTERVAL:
+            placeholder.markdown("".join(parts))
+            pending, last_flush = 0, time.monotonic()
+    
+    response = "".join(parts)
+    placeholder.markdown(response)
+    return response
+
+def create_batch_agent():
+    """Create an agent without conversation memory on the shared MCP client for example runs"""
+    agent = MCPAgent(llm=get_llm(), client=get_mcp_client(), max_steps=MAX_STEPS, memory_enabled=False)
+    start_agent(agent)
+    return agent
+
+async def run_example_batch(agent, questions):
+    """Run the example questions in one loop submission, one at a time"""
+    # The browser-backed MCP server drives a single page, so questions must not overlap
+    results = []
+    for question in questions:
+        try:
+            results.append(await agent.run(question))
+        except Exception as e:
+            results.append(f"Error: {str(e)}")
+    return results
 
 def reset_agent():
-    """Reset the agent and clear cache"""
+    """Reset this session's agent"""
     try:
-        # Clear the cached agent
+        # Drop this session's agent only; the event loop, Bedrock client, LLM and
+        # shared MCP client (with its server sessions) are kept warm
         if "agent" in st.session_state:
             del st.session_state.agent
         
-        # Clear streamlit cache
-        st.cache_resource.clear()
-        
-        # Clean browser profile
-        clean_browser_profile()
-        
         st.success("Agent reset successfully")
         return True
     except Exception as e:
         st.error(f"Failed to reset agent: {e}")
         return False
 
+def add_message(role, content, timestamp=None):
+    """Append a message to the chat history, keeping only the latest MAX_HISTORY messages"""
+    st.session_state.messages.append({
+        "role": role,
+        "content": content,
+        "timestamp": timestamp or datetime.now().strftime("%H:%M:%S")
+    })
+    del st.session_state.messages[:-MAX_HISTORY]
+
 def main():
     st.title("?? MCP Agent Chat Interface")
     st.markdown("Ask questions and get responses from the MCP Agent powered by Claude")
     
+    # Load environment variables before the cached Bedrock client reads its credentials
+    load_dotenv()
+    
+    # Create the Bedrock client up front so its connection is warm before the agent is used
+    try:
+        get_bedrock_client()
+    except Exception as e:
+        st.error(f"Failed to create Bedrock client: {e}")
+    
     # Initialize session state for chat history
     if "messages" not in st.session_state:
         st.session_state.messages = []
@@ -183,23 +474,23 @@ def main():
         st.metric("Total Messages", len(st.session_state.messages))
         
         st.header("Example Questions")
-        example_questions = [
-            "What's the current time?",
-            "Search for information about Python",
-            "Find news about artificial intelligence",
-            "What are the top programming languages?",
-            "Search for weather information"
-        ]
+        for key, question in EXAMPLE_QUESTIONS:
+            if st.button(question, key=key, use_container_width=True,
+                         disabled=st.session_state.get("agent") is None):
+                # Answered by the chat section below in this same run
+                st.session_state.pending_prompt = question
         
-        for question in example_questions:
-            if st.button(question, key=f"example_{hash(question)}", use_container_width=True):
-                # Add the example question to chat
-                st.session_state.messages.append({
-                    "role": "user",
-                    "content": question,
-                    "timestamp": datetime.now().strftime("%H:%M:%S")
-                })
-                st.rerun()
+        if st.button("Run All Examples", use_container_width=True,
+                     disabled=st.session_state.get("agent") is None):
+            with st.spinner("Running example questions..."):
+                results = run_async(
+                    run_example_batch(create_batch_agent(), [question for _, question in EXAMPLE_QUESTIONS])
+                )
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            for (_, question), result in zip(EXAMPLE_QUESTIONS, results):
+                add_message("user", question, timestamp)
+                add_message("assistant", result, timestamp)
+            st.rerun()
     
     # Main chat interface
     st.header("Chat")
@@ -218,15 +509,11 @@ def main():
                 if "timestamp" in message:
                     st.caption(f"Time: {message['timestamp']}")
     
-    # Chat input
-    if prompt := st.chat_input("Ask me anything..."):
+    # Chat input (or an example question picked in the sidebar)
+    if prompt := st.chat_input("Ask me anything...") or st.session_state.pop("pending_prompt", None):
         # Add user message to chat history
         timestamp = datetime.now().strftime("%H:%M:%S")
-        st.session_state.messages.append({
-            "role": "user",
-            "content": prompt,
-            "timestamp": timestamp
-        })
+        add_message("user", prompt, timestamp)
         
         # Display user message
         with st.chat_message("user"):
@@ -235,37 +522,24 @@ def main():
         
         # Get and display assistant response
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                try:
-                    # Run the async function
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    try:
-                        response = loop.run_until_complete(
-                            get_agent_response(st.session_state.agent, prompt)
-                        )
-                    finally:
-                        loop.close()
-                    
-                    st.write(response)
-                    response_timestamp = datetime.now().strftime("%H:%M:%S")
-                    st.caption(f"Time: {response_timestamp}")
-                    
-                    # Add assistant response to chat history
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": response,
-                        "timestamp": response_timestamp
-                    })
-                    
-                except Exception as e:
-                    error_msg = f"Failed to get response: {str(e)}"
-                    st.error(error_msg)
-                    st.session_state.messages.append({
-                        "role": "assistant",
-                        "content": error_msg,
-                        "timestamp": datetime.now().strftime("%H:%M:%S")
-                    })
+            status = st.status("Thinking...", expanded=True)
+            try:
+                # Stream the response from the persistent event loop as it arrives,
+                # showing each MCP tool call in the status container
+                response = write_batched(render_agent_stream(
+                    iter_async(get_agent_response(st.session_state.agent, prompt)), status
+                ))
+                response_timestamp = datetime.now().strftime("%H:%M:%S")
+                st.caption(f"Time: {response_timestamp}")
+                
+                # Add assistant response to chat history
+                add_message("assistant", response, response_timestamp)
+                
+            except Exception as e:
+                status.update(label="Failed", state="error", expanded=False)
+                error_msg = f"Failed to get response: {str(e)}"
+                st.error(error_msg)
+                add_message("assistant", error_msg)
         
         # Rerun to update the display
         st.rerun()
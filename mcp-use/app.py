@@ -1,10 +1,20 @@
 import asyncio
 import os
 from dotenv import load_dotenv
-from langchain_aws import ChatBedrock
+from langchain_aws import ChatBedrockConverse
 from mcp_use import MCPAgent, MCPClient
 import boto3
 
+def chunk_text(chunk):
+    """Extract the text from a streamed model message chunk"""
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(
+        block.get("text", "")
+        for block in chunk.content
+        if isinstance(block, dict) and block.get("type") == "text"
+    )
+
 async def main():
     # Load environment variables
     load_dotenv()
@@ -19,26 +29,30 @@ async def main():
         region_name='us-east-1'  # Change to your preferred region
     )
     
-    # Create LLM using ChatBedrock
-    llm = ChatBedrock(
+    # Create LLM using ChatBedrockConverse (async calls never block the event loop)
+    llm = ChatBedrockConverse(
         client=bedrock_client,
         model_id="anthropic.claude-3-sonnet-20240229-v1:0",
-        model_kwargs={
-            "max_tokens": 4096,
-            "temperature": 0.7,
-            "top_p": 0.9,
-        }
+        max_tokens=4096,
+        temperature=0.7,
+        top_p=0.9,
     )
     
     # Create agent with the client
     agent = MCPAgent(llm=llm, client=client, max_steps=30)
     
-    # Run the query
-    result = await agent.run(
+    # Run the query, printing each model call's text and each tool call as they stream in
+    print("\nResult:", end="", flush=True)
+    async for event in agent.stream_events(
         "Find the best restaurant in San Francisco",
-    )
-    
-    print(f"\nResult: {result}")
+    ):
+        if event["event"] == "on_chat_model_start":
+            print()
+        elif event["event"] == "on_tool_start":
+            print(f"\n[Using tool {event['name']}]", flush=True)
+        elif event["event"] == "on_chat_model_stream":
+            print(chunk_text(event["data"]["chunk"]), end="", flush=True)
+    print()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,12 +1,17 @@
 import asyncio
+import json
 import os
 import streamlit as st
 from dotenv import load_dotenv
-from langchain_aws import ChatBedrock
+from langchain_aws import ChatBedrockConverse
 from mcp_use import MCPAgent, MCPClient
 import boto3
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import traceback
+import threading
+import time
 
 # Page configuration
 st.set_page_config(
@@ -15,35 +20,161 @@ st.set_page_config(
     layout="wide"
 )
 
+# Agent configuration
+AWS_REGION = "us-east-1"  # Change to your preferred region
+MODEL_ID = "anthropic.claude-3-sonnet-20240229-v1:0"
+MODEL_KWARGS = {"max_tokens": 4096, "temperature": 0.7, "top_p": 0.9}
+MAX_STEPS = 30
+BEDROCK_MAX_CONNECTIONS = 50  # Bedrock connection pool and event loop executor size
+MAX_HISTORY = 100  # Chat messages kept in session state
+STREAM_FLUSH_CHUNKS = 16  # Streamed chunks buffered before the answer is redrawn
+STREAM_FLUSH_INTERVAL = 0.05  # Seconds between answer redraws while streaming
+MCP_CONFIG_FILE = "browser_mcp.json"
+
+# Example questions shown in the sidebar, with static widget keys
+EXAMPLE_QUESTIONS = (
+    ("example_restaurant", "Find the best restaurant in San Francisco"),
+    ("example_weather", "What's the weather like today?"),
+    ("example_ai_news", "Search for recent news about AI"),
+    ("example_python", "Find information about Python programming"),
+    ("example_paris", "What are the top tourist attractions in Paris?"),
+)
+
+@st.cache_resource
+def get_event_loop():
+    """Start a persistent event loop in a background thread (shared across reruns)"""
+    loop = asyncio.new_event_loop()
+    # Streaming Bedrock calls and to_thread work wait on the network inside executor
+    # threads, so size the executor for concurrent users rather than the CPU count
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=BEDROCK_MAX_CONNECTIONS))
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+def submit_async(coro):
+    """Schedule a coroutine on the persistent event loop and return its future"""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+
+def run_async(coro):
+    """Run a coroutine on the persistent event loop and wait for its result"""
+    return submit_async(coro).result()
+
+def iter_async(agen):
+    """Iterate an async generator on the persistent event loop from the script thread"""
+    try:
+        while True:
+            try:
+                yield run_async(agen.__anext__())
+            except StopAsyncIteration:
+                return
+    finally:
+        run_async(agen.aclose())
+
+def chunk_text(chunk):
+    """Extract the text from a streamed model message chunk"""
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(
+        block.get("text", "")
+        for block in chunk.content
+        if isinstance(block, dict) and block.get("type") == "text"
+    )
+
+def warm_bedrock_connection(client):
+    """Open a pooled connection to Bedrock with a one-token request"""
+    try:
+        client.converse(
+            modelId=MODEL_ID,
+            messages=[{"role": "user", "content": [{"text": "ping"}]}],
+            inferenceConfig={"maxTokens": 1},
+        )
+    except Exception:
+        # Only the warm connection matters; real errors surface on the first request
+        pass
+
+@st.cache_resource
+def get_bedrock_client():
+    """Create the Bedrock runtime client (cached so its connection pool survives agent resets)"""
+    # Uses IAM role from EC2 instance
+    client = boto3.client(
+        service_name='bedrock-runtime',
+        region_name=AWS_REGION,
+        config=Config(
+            max_pool_connections=BEDROCK_MAX_CONNECTIONS,
+            tcp_keepalive=True,
+            retries={"max_attempts": 10, "mode": "adaptive"},
+        ),
+    )
+    
+    # Warm DNS, TLS and the connection pool in the background before the first message
+    submit_async(asyncio.to_thread(warm_bedrock_connection, client))
+    return client
+
+@st.cache_data(max_entries=1)
+def parse_mcp_config(path, mtime_ns):
+    """Parse the MCP configuration file (cached until its modification time changes)"""
+    with open(path, "rb") as f:
+        return json.load(f)
+
+def load_mcp_config(path):
+    """Load the MCP configuration, re-parsing the file only when it has changed"""
+    return parse_mcp_config(path, os.stat(path).st_mtime_ns)
+
 @st.cache_resource
+def get_mcp_client():
+    """Create the MCP client (shared by every user so its server sessions start only once)"""
+    return MCPClient.from_dict(load_mcp_config(MCP_CONFIG_FILE))
+
+@st.cache_resource
+def get_mcp_lock():
+    """Create the lock that serializes opening the shared MCP sessions"""
+    return asyncio.Lock()
+
+async def connect_mcp_client(client, lock):
+    """Open the shared MCP client's server sessions once, however many users ask"""
+    async with lock:
+        if not client.get_all_active_sessions():
+            await client.create_all_sessions()
+
+@st.cache_resource
+def get_llm():
+    """Create the Bedrock chat model (cached and shared across agent resets)"""
+    # Create LLM using ChatBedrockConverse (streams via the Bedrock ConverseStream API)
+    return ChatBedrockConverse(
+        client=get_bedrock_client(),
+        model_id=MODEL_ID,
+        **MODEL_KWARGS,
+    )
+
+def start_agent(agent):
+    """Load an agent's MCP tools, marking its system prompt for Bedrock prompt caching"""
+    run_async(agent.initialize())
+    
+    # Prompt caching is only for models that support it (e.g. Claude 3.5 Haiku,
+    # Claude 3.7 Sonnet). Bedrock caches everything before the cache point, so put it
+    # after the system prompt MCPAgent builds, covering the tool schemas and the prompt
+    if os.getenv("BEDROCK_PROMPT_CACHING", "false").lower() == "true":
+        agent.set_system_message([
+            {"type": "text", "text": agent.get_system_message().content},
+            ChatBedrockConverse.create_cache_point(),
+        ])
+
 def initialize_agent():
-    """Initialize the MCP agent (cached to avoid recreation)"""
+    """Initialize this session's MCP agent on top of the shared MCP client and LLM"""
     try:
         # Load environment variables
         load_dotenv()
         
-        # Create MCPClient from configuration file
-        client = MCPClient.from_config_file("browser_mcp.json")
-        
-        # Create Bedrock client (uses IAM role from EC2 instance)
-        bedrock_client = boto3.client(
-            service_name='bedrock-runtime',
-            region_name='us-east-1'  # Change to your preferred region
-        )
+        # Get the shared MCPClient created from the configuration file
+        client = get_mcp_client()
         
-        # Create LLM using ChatBedrock
-        llm = ChatBedrock(
-            client=bedrock_client,
-            model_id="anthropic.claude-3-sonnet-20240229-v1:0",
-            model_kwargs={
-                "max_tokens": 4096,
-                "temperature": 0.7,
-                "top_p": 0.9,
-            }
-        )
+        # Get the shared LLM
+        llm = get_llm()
         
-        # Create agent with the client
-        agent = MCPAgent(llm=llm, client=client, max_steps=30)
+        # Open the shared MCP sessions (first user only), then give this session its own
+        # agent, with its own conversation memory, on top of them
+        run_async(connect_mcp_client(client, get_mcp_lock()))
+        agent = MCPAgent(llm=llm, client=client, max_steps=MAX_STEPS)
+        start_agent(agent)
         
         return agent
     except Exception as e:
@@ -51,12 +182,96 @@ def initialize_agent():
         return None
 
 async def get_agent_response(agent, query):
-    """Get response from the MCP agent"""
+    """Stream tool calls and response text from the MCP agent as they happen"""
     try:
-        result = await agent.run(query)
-        return result
+        # ConverseStream chunks are pulled with next() in the loop's executor by
+        # langchain-core, so the blocking boto3 iterator never runs on the loop itself
+        async for event in agent.stream_events(query):
+            if event["event"] == "on_chat_model_start":
+                yield "step", None
+            elif event["event"] == "on_tool_start":
+                yield "tool", event["name"]
+            elif event["event"] == "on_chat_model_stream":
+                text = chunk_text(event["data"]["chunk"])
+                if text:
+                    yield "text", text
     except Exception as e:
-        return f"Error: {str(e)}\n\nTraceback:\n{traceback.format_exc()}"
+        yield "error", e
+
+def render_agent_stream(events, status):
+    """Write tool calls and errors into the status container and yield the response text"""
+    state = "complete"
+    step_parts = []
+    for kind, value in events:
+        if kind == "step":
+            # A new model call started, so the text so far was narration before a tool
+            # call: move it into the status and yield None so only the answer is kept
+            if step_parts:
+                status.markdown("".join(step_parts))
+                step_parts = []
+                yield None
+        elif kind == "tool":
+            status.write(f"Using tool `{value}`")
+        elif kind == "error":
+            # The traceback is only formatted here, inside the collapsed status
+            state = "error"
+            status.code("".join(traceback.format_exception(value)), language="text")
+            # Move any partial answer into the status so the error is shown on its own
+            if step_parts:
+                status.markdown("".join(step_parts))
+                step_parts = []
+                yield None
+            yield f"Error: {str(value)}"
+        else:
+            step_parts.append(value)
+            yield value
+    status.update(label="Done" if state == "complete" else "Failed", state=state, expanded=False)
+
+def write_batched(chunks):
+    """Render streamed text into a single placeholder, flushing in batches, and return it"""
+    placeholder = st.empty()
+    parts, pending, last_flush = [], 0, time.monotonic()
+    for chunk in chunks:
+        # None discards the text so far (narration that preceded a tool call)
+        if chunk is None:
+            parts, pending = [], 0
+            placeholder.empty()
+            continue
+        parts.append(chunk)
+        pending += 1
+        if pending >= STREAM_FLUSH_CHUNKS or time.monotonic() - last_flush >= STREAM_FLUSH_INTERVAL:
+            placeholder.markdown("".join(parts))
+            pending, last_flush = 0, time.monotonic()
+    
+    response = "".join(parts)
+    placeholder.markdown(response)
+    return response
+
+def create_batch_agent():
+    """Create an agent without conversation memory on the shared MCP client for example runs"""
+    agent = MCPAgent(llm=get_llm(), client=get_mcp_client(), max_steps=MAX_STEPS, memory_enabled=False)
+    start_agent(agent)
+    return agent
+
+async def run_example_batch(agent, questions):
+    """Run the example questions in one loop submission, one at a time"""
+    # The browser-backed MCP server drives a single page, so questions must not overlap
+    results = []
+    for question in questions:
+        try:
+            results.append(await agent.run(question))
+        except Exception as e:
+            results.append(f"Error: {str(e)}")
+    return results
+
+def add_message(role, content, timestamp=None):
+    """Append a message to the chat history, keeping only the latest MAX_HISTORY messages"""
+    st.session_state.messages.append({
+        "role": role,
+        "content": content,
+        "timestamp": timestamp or datetime.now().strftime("%H:%M:%S")
+    })
+    del st.session_state.messages[:-MAX_HISTORY]
 
 def main():
     st.title("?? MCP Agent Chat Interface")
@@ -89,23 +304,21 @@ def main():
         st.metric("Total Messages", len(st.session_state.messages))
         
         st.header("Example Questions")
-        example_questions = [
-            "Find the best restaurant in San Francisco",
-            "What's the weather like today?",
-            "Search for recent news about AI",
-            "Find information about Python programming",
-            "What are the top tourist attractions in Paris?"
-        ]
+        for key, question in EXAMPLE_QUESTIONS:
+            if st.button(question, key=key, use_container_width=True):
+                # Answered by the chat section below in this same run
+                st.session_state.pending_prompt = question
         
-        for question in example_questions:
-            if st.button(question, key=f"example_{question[:20]}", use_container_width=True):
-                # Add the example question to chat
-                st.session_state.messages.append({
-                    "role": "user",
-                    "content": question,
-                    "timestamp": datetime.now().strftime("%H:%M:%S")
-                })
-                st.rerun()
+        if st.button("Run All Examples", use_container_width=True):
+            with st.spinner("Running example questions..."):
+                results = run_async(
+                    run_example_batch(create_batch_agent(), [question for _, question in EXAMPLE_QUESTIONS])
+                )
+            timestamp = datetime.now().strftime("%H:%M:%S")
+            for (_, question), result in zip(EXAMPLE_QUESTIONS, results):
+                add_message("user", question, timestamp)
+                add_message("assistant", result, timestamp)
+            st.rerun()
     
     # Main chat interface
     st.header("Chat")
@@ -119,15 +332,11 @@ def main():
                 if "timestamp" in message:
                     st.caption(f"Time: {message['timestamp']}")
     
-    # Chat input
-    if prompt := st.chat_input("Ask me anything..."):
+    # Chat input (or an example question picked in the sidebar)
+    if prompt := st.chat_input("Ask me anything...") or st.session_state.pop("pending_prompt", None):
         # Add user message to chat history
         timestamp = datetime.now().strftime("%H:%M:%S")
-        st.session_state.messages.append({
-            "role": "user",
-            "content": prompt,
-            "timestamp": timestamp
-        })
+        add_message("user", prompt, timestamp)
         
         # Display user message
         with st.chat_message("user"):
@@ -136,27 +345,17 @@ def main():
         
         # Get and display assistant response
         with st.chat_message("assistant"):
-            with st.spinner("Thinking..."):
-                # Run the async function
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                try:
-                    response = loop.run_until_complete(
-                        get_agent_response(st.session_state.agent, prompt)
-                    )
-                finally:
-                    loop.close()
-                
-                st.write(response)
-                response_timestamp = datetime.now().strftime("%H:%M:%S")
-                st.caption(f"Time: {response_timestamp}")
+            status = st.status("Thinking...", expanded=True)
+            # Stream the response from the persistent event loop as it arrives,
+            # showing each MCP tool call in the status container
+            response = write_batched(render_agent_stream(
+                iter_async(get_agent_response(st.session_state.agent, prompt)), status
+            ))
+            response_timestamp = datetime.now().strftime("%H:%M:%S")
+            st.caption(f"Time: {response_timestamp}")
         
         # Add assistant response to chat history
-        st.session_state.messages.append({
-            "role": "assistant",
-            "content": response,
-            "timestamp": response_timestamp
-        })
+        add_message("assistant", response, response_timestamp)
         
         # Rerun to update the display
         st.rerun()